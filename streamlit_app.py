@@ -1,12 +1,17 @@
+import contextlib
+import functools
 import io
 import json
 import os
+import queue
 import sqlite3
+import threading
 import time
 import uuid
 import hashlib
 import hmac
 from datetime import datetime, timedelta, time as dtime
+from html import escape as html_escape
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
@@ -35,13 +40,27 @@ AUTO_COMPLETE_AFTER_MIN = 20
 KEEP_COMPLETED_MINUTES = 10
 MATERIALIZE_TOURS_HOURS_BEFORE = 12
 DISPLAY_WINDOW_HOURS = 12
+# Puffer für Textvergleiche von ISO-Zeiten mit unterschiedlichem UTC-Offset (Sommer-/Winterzeit)
+OFFSET_PREFILTER_MARGIN_HOURS = 2
 BLINK_UNDER_MINUTES = 10
 CRITICAL_UNDER_MINUTES = 5
 AUTO_BACKUP_KEEP = 30
+REFRESH_BACKOFF_AFTER_POLLS = 3
+REFRESH_BACKOFF_MAX_FACTOR = 2
+LOAD_CACHE_TTL_SECONDS = 30
+READER_POOL_SIZE = 4
+MATERIALIZE_INTERVAL_SECONDS = 60
+# Bei jeder Änderung an migrate_db erhöhen
+SCHEMA_VERSION = 2
 TRUCK_MAX_PLACES = 28
 
 WEEKDAYS_DE = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
 WEEKDAY_TO_INT = {d: i for i, d in enumerate(WEEKDAYS_DE)}
+TIME_OPTIONS_HALF_HOUR = [f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 30)]
+TIME_OPTION_INDEX = {t: i for i, t in enumerate(TIME_OPTIONS_HALF_HOUR)}
+LOCATION_TYPES = ["KRANKENHAUS", "ALTENHEIM", "MVZ"]
+SCREEN_MODES = ["DETAIL", "OVERVIEW", "WAREHOUSE"]
+SCREEN_FILTER_TYPES = ["ALLE"] + LOCATION_TYPES
 
 ZONE_NAME_MAP = {
     1: "Zone A",
@@ -128,48 +147,56 @@ def now_berlin() -> datetime:
     return datetime.now(TZ)
 
 
-def ensure_tz(dt):
-    if dt is None:
-        return None
-    if hasattr(dt, "to_pydatetime"):
-        dt = dt.to_pydatetime()
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=TZ)
-    return dt.astimezone(TZ)
+def naive_timestamp_mask(values: pd.Series) -> pd.Series:
+    return values.notna() & ~values.astype(str).str.contains(r"(?:[+-]\d{2}:\d{2}|Z)$", na=False)
+
+
+def to_berlin_datetimes(values: pd.Series) -> pd.Series:
+    # Gespeichert wird ISO 8601 mit UTC-Offset; Altwerte ohne Offset gelten als Berliner Ortszeit.
+    result = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601").dt.tz_convert(TZ)
+    naive = naive_timestamp_mask(values)
+    if naive.any():
+        local = pd.to_datetime(values[naive], errors="coerce", format="ISO8601")
+        # ambiguous=True entspricht replace(tzinfo=TZ): in der doppelten Stunde gilt die Sommerzeit
+        result[naive] = local.dt.tz_localize(TZ, ambiguous=[True] * len(local), nonexistent="shift_forward")
+    return result
 
 
+@functools.lru_cache(maxsize=4096, typed=True)
 def escape_html(text: str) -> str:
-    text = "" if text is None else str(text)
-    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    return html_escape("" if text is None else str(text))
 
 
 def parse_screen_ids(value) -> list[int]:
     if value is None:
         return []
-    s = str(value).strip()
-    if not s:
-        return []
-    return [int(x.strip()) for x in s.split(",") if x.strip().isdigit()]
+    return list(_parse_screen_ids_text(str(value).strip()))
 
 
-def fmt_compact(td: timedelta) -> str:
-    total = max(0, int(td.total_seconds()))
-    h = total // 3600
-    m = (total % 3600) // 60
-    s = total % 60
-    return f"{h:02d}:{m:02d}:{s:02d}" if h > 0 else f"{m:02d}:{s:02d}"
+@functools.lru_cache(maxsize=512)
+def _parse_screen_ids_text(s: str) -> tuple[int, ...]:
+    return tuple(int(x.strip()) for x in s.split(",") if x.strip().isdigit())
 
 
-def completion_deadline(dep_dt: datetime) -> datetime:
-    return dep_dt + timedelta(minutes=AUTO_COMPLETE_AFTER_MIN)
+def fmt_compact_series(td: pd.Series) -> pd.Series:
+    total = td.dt.total_seconds().clip(lower=0).astype(int)
+    h = (total // 3600).astype(str).str.zfill(2)
+    m = ((total % 3600) // 60).astype(str).str.zfill(2)
+    s = (total % 60).astype(str).str.zfill(2)
+    return (m + ":" + s).where(total < 3600, h + ":" + m + ":" + s)
 
 
-def time_options_half_hour():
-    return [f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 30)]
+def completion_deadline(dep_dt: pd.Series) -> pd.Series:
+    return dep_dt + timedelta(minutes=AUTO_COMPLETE_AFTER_MIN)
 
 
 def next_datetime_for_weekday_time(weekday_name: str, hour: int, minute: int) -> datetime:
-    now = now_berlin()
+    # Ziele liegen immer auf vollen Minuten, daher ändert das Abrunden von now nichts am Ergebnis.
+    return _next_datetime_cached(weekday_name, hour, minute, now_berlin().replace(second=0, microsecond=0))
+
+
+@functools.lru_cache(maxsize=256)
+def _next_datetime_cached(weekday_name: str, hour: int, minute: int, now: datetime) -> datetime:
     target = WEEKDAY_TO_INT[weekday_name]
     days_ahead = (target - now.weekday()) % 7
     candidate_date = now.date() + timedelta(days=days_ahead)
@@ -270,6 +297,19 @@ def execute_with_retry(cur: sqlite3.Cursor, sql: str, params: tuple = (), retrie
             raise
 
 
+def executemany_with_retry(cur: sqlite3.Cursor, sql: str, seq_of_params: list, retries: int = 6):
+    for i in range(retries):
+        try:
+            cur.executemany(sql, seq_of_params)
+            return
+        except sqlite3.OperationalError as e:
+            msg = str(e).lower()
+            if "locked" in msg or "busy" in msg:
+                time.sleep(0.25 * (i + 1))
+                continue
+            raise
+
+
 # =========================================================
 # DATENBANK
 # =========================================================
@@ -455,19 +495,26 @@ def init_db(conn: sqlite3.Connection):
             defaults,
         )
 
-    cur.execute("SELECT id FROM screens")
-    for sid in [int(r[0]) for r in cur.fetchall()]:
-        cur.execute("INSERT OR IGNORE INTO tickers (screen_id, text, active) VALUES (?, '', 0)", (sid,))
+    cur.execute("INSERT OR IGNORE INTO tickers (screen_id, text, active) SELECT id, '', 0 FROM screens")
 
     cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_departures_source_key ON departures(source_key)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_departures_datetime ON departures(datetime)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_departures_screen_id ON departures(screen_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_departures_screen_datetime ON departures(screen_id, datetime)")
+    # Nur offene Abfahrten – Grundlage für die Status-Updates in update_departure_statuses
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_departures_open_datetime ON departures(datetime) WHERE UPPER(COALESCE(status, '')) NOT IN ('STORNIERT', 'ABGESCHLOSSEN')")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_departures_location_id ON departures(location_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tours_location_id ON tours(location_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tour_stops_location_id ON tour_stops(location_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tour_stops_tour_id ON tour_stops(tour_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_event_time ON audit_log(event_time)")
     conn.commit()
 
 
 def migrate_db(conn: sqlite3.Connection):
     cur = conn.cursor()
+    if cur.execute("PRAGMA user_version;").fetchone()[0] >= SCHEMA_VERSION:
+        return
 
     def table_cols(table: str) -> set[str]:
         try:
@@ -476,8 +523,7 @@ def migrate_db(conn: sqlite3.Connection):
         except Exception:
             return set()
 
-    init_db(conn)
-
+    departures_cols = table_cols("departures")
     for col, sql in {
         "screen_id": "ALTER TABLE departures ADD COLUMN screen_id INTEGER",
         "source_key": "ALTER TABLE departures ADD COLUMN source_key TEXT",
@@ -487,9 +533,10 @@ def migrate_db(conn: sqlite3.Connection):
         "countdown_enabled": "ALTER TABLE departures ADD COLUMN countdown_enabled INTEGER NOT NULL DEFAULT 1",
         "cooled_required": "ALTER TABLE departures ADD COLUMN cooled_required INTEGER NOT NULL DEFAULT 0",
     }.items():
-        if col not in table_cols("departures"):
+        if col not in departures_cols:
             cur.execute(sql)
 
+    locations_cols = table_cols("locations")
     for col, sql in {
         "color": "ALTER TABLE locations ADD COLUMN color TEXT",
         "text_color": "ALTER TABLE locations ADD COLUMN text_color TEXT",
@@ -497,32 +544,35 @@ def migrate_db(conn: sqlite3.Connection):
         "postal_code": "ALTER TABLE locations ADD COLUMN postal_code TEXT",
         "city": "ALTER TABLE locations ADD COLUMN city TEXT",
     }.items():
-        if col not in table_cols("locations"):
+        if col not in locations_cols:
             cur.execute(sql)
 
+    tours_cols = table_cols("tours")
     for col, sql in {
         "minute": "ALTER TABLE tours ADD COLUMN minute INTEGER NOT NULL DEFAULT 0",
         "screen_ids": "ALTER TABLE tours ADD COLUMN screen_ids TEXT",
         "countdown_enabled": "ALTER TABLE tours ADD COLUMN countdown_enabled INTEGER NOT NULL DEFAULT 0",
         "cooled_required": "ALTER TABLE tours ADD COLUMN cooled_required INTEGER NOT NULL DEFAULT 0",
     }.items():
-        if col not in table_cols("tours"):
+        if col not in tours_cols:
             cur.execute(sql)
 
+    tour_stops_cols = table_cols("tour_stops")
     for col, sql in {
         "cooled_required": "ALTER TABLE tour_stops ADD COLUMN cooled_required INTEGER NOT NULL DEFAULT 0",
         "cooled_note": "ALTER TABLE tour_stops ADD COLUMN cooled_note TEXT",
     }.items():
-        if col not in table_cols("tour_stops"):
+        if col not in tour_stops_cols:
             cur.execute(sql)
 
+    holiday_tours_cols = table_cols("holiday_tours")
     for col, sql in {
         "minute": "ALTER TABLE holiday_tours ADD COLUMN minute INTEGER NOT NULL DEFAULT 0",
         "screen_ids": "ALTER TABLE holiday_tours ADD COLUMN screen_ids TEXT",
         "countdown_enabled": "ALTER TABLE holiday_tours ADD COLUMN countdown_enabled INTEGER NOT NULL DEFAULT 0",
         "cooled_required": "ALTER TABLE holiday_tours ADD COLUMN cooled_required INTEGER NOT NULL DEFAULT 0",
     }.items():
-        if col not in table_cols("holiday_tours"):
+        if col not in holiday_tours_cols:
             cur.execute(sql)
 
     delivery_item_cols = table_cols("delivery_note_items")
@@ -538,6 +588,16 @@ def migrate_db(conn: sqlite3.Connection):
         if col not in delivery_item_cols:
             cur.execute(sql)
 
+    # Altbestände ohne UTC-Offset umschreiben, die julianday()-Vergleiche würden sie als UTC lesen
+    for col in ("datetime", "ready_at", "completed_at"):
+        rows = cur.execute(f"SELECT id, {col} FROM departures WHERE {col} IS NOT NULL").fetchall()
+        if not rows:
+            continue
+        values = pd.Series([r[1] for r in rows], index=[r[0] for r in rows], dtype=object)
+        localized = to_berlin_datetimes(values[naive_timestamp_mask(values)]).dropna()
+        cur.executemany(f"UPDATE departures SET {col}=? WHERE id=?", [(ts.isoformat(), int(dep_id)) for dep_id, ts in localized.items()])
+
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
     conn.commit()
 
 
@@ -549,6 +609,9 @@ def get_connection():
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA foreign_keys=ON;")
     conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-20000;")
+    conn.execute("PRAGMA mmap_size=134217728;")
     init_db(conn)
     migrate_db(conn)
     if not integrity_ok(conn):
@@ -556,23 +619,97 @@ def get_connection():
     return conn
 
 
+@st.cache_resource
+def get_reader_pool():
+    # Schema anlegen/migrieren, bevor Lese-Verbindungen geöffnet werden
+    get_connection()
+    pool = queue.Queue()
+    for _ in range(READER_POOL_SIZE):
+        conn = sqlite3.connect(f"file:{DB_PATH.as_posix()}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA cache_size=-20000;")
+        conn.execute("PRAGMA mmap_size=134217728;")
+        pool.put(conn)
+    return pool
+
+
+@st.cache_resource
+def get_write_lock():
+    return threading.Lock()
+
+
+@st.cache_resource
+def get_materialize_state():
+    return {"last_run": 0.0}
+
+
+def invalidate_materialization():
+    get_materialize_state()["last_run"] = 0.0
+
+
+@contextlib.contextmanager
+def reader():
+    pool = get_reader_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+
+@contextlib.contextmanager
+def writer():
+    # Alle Sessions teilen sich eine Schreib-Verbindung, Transaktionen dürfen sich nicht überlappen
+    with get_write_lock():
+        conn = get_connection()
+        try:
+            yield conn
+        except Exception:
+            # Halbfertige Transaktion nicht beim nächsten fremden Commit mitschreiben
+            conn.rollback()
+            raise
+
+
+def run_departure_maintenance():
+    with writer() as conn:
+        # Touren reichen MATERIALIZE_TOURS_HOURS_BEFORE voraus, einmal pro Minute genügt;
+        # Admin-Änderungen setzen den Zeitstempel über invalidate_materialization() zurück.
+        state = get_materialize_state()
+        if time.monotonic() - state["last_run"] >= MATERIALIZE_INTERVAL_SECONDS:
+            cleanup_materialized_departures(conn)
+            materialize_tours_to_departures(conn)
+            materialize_holiday_tours_to_departures(conn)
+            state["last_run"] = time.monotonic()
+        update_departure_statuses(conn)
+
+
 def read_df(conn: sqlite3.Connection, query: str, params=()):
-    return pd.read_sql_query(query, conn, params=params)
+    cur = conn.execute(query, params)
+    return pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
 
 
 # =========================================================
 # LOAD / EXPORT
 # =========================================================
-def load_locations(conn):
-    return read_df(conn, "SELECT id, name, type, active, color, text_color, street, postal_code, city FROM locations ORDER BY id")
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_locations(_conn):
+    return read_df(_conn, "SELECT id, name, type, active, color, text_color, street, postal_code, city FROM locations ORDER BY id")
 
 
-def load_screens(conn):
-    return read_df(conn, "SELECT s.*, t.text, t.active AS ticker_active FROM screens s LEFT JOIN tickers t ON t.screen_id=s.id ORDER BY id")
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_screens(_conn):
+    return read_df(_conn, "SELECT s.*, t.text, t.active AS ticker_active FROM screens s LEFT JOIN tickers t ON t.screen_id=s.id ORDER BY id")
 
 
-def load_tours(conn):
-    return read_df(conn, """
+def load_screens_by_id(conn) -> dict:
+    return {int(r["id"]): r for r in load_screens(conn).to_dict("records")}
+
+
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_tours(_conn):
+    return read_df(_conn, """
         SELECT t.id, t.name, t.weekday, t.hour, t.minute, t.location_id,
                t.note, t.active, t.screen_ids, t.countdown_enabled, t.cooled_required,
                l.name AS location_name
@@ -582,19 +719,27 @@ def load_tours(conn):
     """)
 
 
-def load_tour_stops(conn, tour_id: int):
-    return read_df(conn, """
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_tour_stops(_conn, tour_id: int):
+    return read_df(_conn, """
         SELECT ts.location_id, ts.position, ts.cooled_required, ts.cooled_note,
                l.name AS location_name, l.street, l.postal_code, l.city
         FROM tour_stops ts
         JOIN locations l ON l.id = ts.location_id
         WHERE ts.tour_id = ?
         ORDER BY ts.position
-    """, (tour_id,))
+    """, (int(tour_id),))
 
 
-def load_holiday_tours(conn):
-    return read_df(conn, """
+def clear_load_caches():
+    for loader in (load_locations, load_screens, load_tours, load_tour_stops, load_holiday_tours, load_holiday_tour_stops, export_tours_csv, export_holiday_tours_csv):
+        loader.clear()
+    invalidate_materialization()
+
+
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_holiday_tours(_conn):
+    return read_df(_conn, """
         SELECT h.id, h.name, h.holiday_date, h.hour, h.minute, h.location_id,
                h.note, h.active, h.screen_ids, h.countdown_enabled, h.cooled_required,
                l.name AS location_name
@@ -604,18 +749,18 @@ def load_holiday_tours(conn):
     """)
 
 
-def load_holiday_tour_stops(conn, holiday_tour_id: int):
-    return read_df(conn, """
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def load_holiday_tour_stops(_conn, holiday_tour_id: int):
+    return read_df(_conn, """
         SELECT hs.location_id, hs.position, l.name AS location_name
         FROM holiday_tour_stops hs
         JOIN locations l ON l.id = hs.location_id
         WHERE hs.holiday_tour_id = ?
         ORDER BY hs.position
-    """, (holiday_tour_id,))
+    """, (int(holiday_tour_id),))
 
 
-def load_departures_with_locations(conn):
-    df = read_df(conn, """
+DEPARTURES_WITH_LOCATIONS_SQL = """
         SELECT d.id AS id,
                d.datetime AS datetime,
                d.location_id AS location_id,
@@ -636,16 +781,59 @@ def load_departures_with_locations(conn):
                l.text_color AS location_text_color
         FROM departures d
         JOIN locations l ON d.location_id = l.id
-    """)
+"""
+
+
+def _prepare_departures_df(df: pd.DataFrame) -> pd.DataFrame:
     if not df.empty:
         for col in ["datetime", "ready_at", "completed_at"]:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-            df[col] = df[col].apply(lambda x: ensure_tz(x) if pd.notnull(x) else x)
+            df[col] = to_berlin_datetimes(df[col])
         df["countdown_enabled"] = pd.to_numeric(df["countdown_enabled"], errors="coerce").fillna(1).astype(int)
         df["cooled_required"] = pd.to_numeric(df["cooled_required"], errors="coerce").fillna(0).astype(int)
     return df
 
 
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, max_entries=4, show_spinner=False)
+def _load_departures_with_locations(_conn, db_version: tuple[int, int]):
+    return _prepare_departures_df(read_df(_conn, f"{DEPARTURES_WITH_LOCATIONS_SQL} ORDER BY julianday(d.datetime), d.id"))
+
+
+def load_departures_with_locations(conn):
+    # Abfahrten ändern sich auch durch die Status-Automatik; data_version erfasst fremde Commits,
+    # total_changes die eigenen auf der geteilten Verbindung.
+    db_version = (conn.total_changes, conn.execute("PRAGMA data_version;").fetchone()[0])
+    return _load_departures_with_locations(conn, db_version)
+
+
+@functools.lru_cache(maxsize=32)
+def _screen_sql(filter_type: str, filter_locations: tuple[int, ...]) -> tuple[str, tuple]:
+    clauses = [
+        "l.active = 1",
+        "(d.screen_id IS NULL OR d.screen_id = ?)",
+        "d.datetime >= ?",
+        "d.datetime <= ?",
+        "(d.status != 'ABGESCHLOSSEN' OR d.completed_at IS NULL OR d.completed_at >= ?)",
+    ]
+    params = []
+    if filter_type != "ALLE":
+        clauses.append("l.type = ?")
+        params.append(filter_type)
+    if filter_locations:
+        clauses.append(f"d.location_id IN ({', '.join('?' * len(filter_locations))})")
+        params.extend(filter_locations)
+    return f"{DEPARTURES_WITH_LOCATIONS_SQL} WHERE {' AND '.join(clauses)}", tuple(params)
+
+
+def load_screen_departures(conn, screen_id: int, filter_type: str, filter_locations: str, start: datetime, end: datetime):
+    sql, params = _screen_sql(str(filter_type or "ALLE"), tuple(sorted(parse_screen_ids(filter_locations))))
+    # Textvergleich als Index-Vorfilter mit Puffer für Sommer-/Winterzeit-Offsets; exakt filtert get_screen_data.
+    margin = timedelta(hours=OFFSET_PREFILTER_MARGIN_HOURS)
+    window = ((start - margin).isoformat(), (end + margin).isoformat())
+    # Abgeschlossene nur solange sie noch angezeigt werden (KEEP_COMPLETED_MINUTES)
+    completed_after = (now_berlin() - timedelta(minutes=KEEP_COMPLETED_MINUTES) - margin).isoformat()
+    return _prepare_departures_df(read_df(conn, sql, (int(screen_id), *window, completed_after, *params)))
+
+
 def export_backup_json(conn) -> bytes:
     tours = load_tours(conn)
     holiday_tours = load_holiday_tours(conn)
@@ -776,11 +964,10 @@ def import_backup_json(conn, data: dict):
         else:
             cur.execute("INSERT INTO tours (id, name, weekday, hour, minute, location_id, note, active, screen_ids, countdown_enabled, cooled_required) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (tour_id, *vals))
         cur.execute("DELETE FROM tour_stops WHERE tour_id=?", (tour_id,))
-        for s in t.get("stops", []):
-            cur.execute(
-                "INSERT INTO tour_stops (tour_id, location_id, position, cooled_required, cooled_note) VALUES (?, ?, ?, ?, ?)",
-                (tour_id, int(s["location_id"]), int(s.get("position", 0)), int(s.get("cooled_required", 0) or 0), str(s.get("cooled_note") or "")),
-            )
+        cur.executemany(
+            "INSERT INTO tour_stops (tour_id, location_id, position, cooled_required, cooled_note) VALUES (?, ?, ?, ?, ?)",
+            [(tour_id, int(s["location_id"]), int(s.get("position", 0)), int(s.get("cooled_required", 0) or 0), str(s.get("cooled_note") or "")) for s in t.get("stops", [])],
+        )
 
     if "screens" in data:
         for s in data.get("screens", []):
@@ -805,6 +992,7 @@ def import_backup_json(conn, data: dict):
             ))
 
     conn.commit()
+    clear_load_caches()
 
 
 # =========================================================
@@ -813,30 +1001,23 @@ def import_backup_json(conn, data: dict):
 def update_departure_statuses(conn: sqlite3.Connection):
     now = now_berlin()
     now_iso = now.isoformat(timespec="seconds")
-    df = read_df(conn, "SELECT id, datetime, status FROM departures")
-    if df.empty:
-        return
-    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
-    df = df.dropna(subset=["datetime"])
-    df["datetime"] = df["datetime"].apply(ensure_tz)
-
-    to_ready, to_done = [], []
-    for _, r in df.iterrows():
-        dep_dt = ensure_tz(r["datetime"])
-        status = str(r["status"] or "").upper()
-        if status in ("STORNIERT", "ABGESCHLOSSEN"):
-            continue
-        if now >= completion_deadline(dep_dt):
-            to_done.append(int(r["id"]))
-        elif now >= dep_dt and status != "BEREIT":
-            to_ready.append(int(r["id"]))
-
-    if to_ready:
-        conn.executemany("UPDATE departures SET status='BEREIT', ready_at=COALESCE(ready_at, ?) WHERE id=?", [(now_iso, i) for i in to_ready])
-    if to_done:
-        conn.executemany("UPDATE departures SET status='ABGESCHLOSSEN', completed_at=COALESCE(completed_at, ?) WHERE id=?", [(now_iso, i) for i in to_done])
-    if to_ready or to_done:
-        conn.commit()
+    done_cutoff = (now - timedelta(minutes=AUTO_COMPLETE_AFTER_MIN)).isoformat()
+    # Der Textvergleich nutzt idx_departures_open_datetime als Vorfilter; wegen wechselnder
+    # UTC-Offsets (Sommer-/Winterzeit) entscheidet julianday() über den genauen Zeitpunkt.
+    index_cutoff = (now + timedelta(hours=OFFSET_PREFILTER_MARGIN_HOURS)).isoformat()
+    cur = conn.cursor()
+    execute_with_retry(cur, """
+        UPDATE departures SET status='ABGESCHLOSSEN', completed_at=COALESCE(completed_at, ?)
+        WHERE UPPER(COALESCE(status, '')) NOT IN ('STORNIERT', 'ABGESCHLOSSEN')
+          AND datetime <= ? AND julianday(datetime) <= julianday(?)
+    """, (now_iso, index_cutoff, done_cutoff))
+    execute_with_retry(cur, """
+        UPDATE departures SET status='BEREIT', ready_at=COALESCE(ready_at, ?)
+        WHERE UPPER(COALESCE(status, '')) NOT IN ('STORNIERT', 'ABGESCHLOSSEN')
+          AND UPPER(COALESCE(status, '')) != 'BEREIT'
+          AND datetime <= ? AND julianday(datetime) <= julianday(?)
+    """, (now_iso, index_cutoff, now.isoformat()))
+    conn.commit()
 
 
 def cleanup_materialized_departures(conn: sqlite3.Connection):
@@ -850,37 +1031,31 @@ def cleanup_materialized_departures(conn: sqlite3.Connection):
 
 def materialize_tours_to_departures(conn: sqlite3.Connection):
     now = now_berlin()
-    df = read_df(conn, """
-        SELECT t.id AS tour_id, t.weekday, t.hour, t.minute, t.note AS tour_note,
-               t.active AS tour_active, t.screen_ids AS tour_screen_ids,
-               t.countdown_enabled AS tour_countdown_enabled,
-               ts.location_id, ts.position, ts.cooled_required, ts.cooled_note,
-               l.active AS location_active
+    stops = conn.execute("""
+        SELECT t.id, t.weekday, t.hour, t.minute, t.note, t.countdown_enabled, t.screen_ids,
+               ts.location_id, ts.position, ts.cooled_required, ts.cooled_note
         FROM tours t
         JOIN tour_stops ts ON ts.tour_id = t.id
         JOIN locations l ON l.id = ts.location_id
-    """)
-    if df.empty:
-        return
+        WHERE t.active = 1 AND l.active = 1
+    """).fetchall()
+    rows = []
 
-    df = df[(df["tour_active"] == 1) & (df["location_active"] == 1)]
-    cur = conn.cursor()
-
-    for _, r in df.iterrows():
-        weekday = str(r["weekday"])
+    for tour_id, weekday, hour, minute, tour_note, countdown_enabled, tour_screen_ids, location_id, position, cooled_required, cooled_note in stops:
+        weekday = str(weekday)
         if weekday not in WEEKDAYS_DE:
             continue
-        screen_ids = parse_screen_ids(r["tour_screen_ids"])
+        screen_ids = parse_screen_ids(tour_screen_ids)
         if not screen_ids:
             continue
 
-        dep_dt = next_datetime_for_weekday_time(weekday, int(r["hour"]), int(r["minute"]))
+        dep_dt = next_datetime_for_weekday_time(weekday, int(hour), int(minute))
         if dep_dt - now > timedelta(hours=MATERIALIZE_TOURS_HOURS_BEFORE):
             continue
 
-        note_text = str(r["tour_note"] or "").strip()
-        cooled_flag = int(r["cooled_required"] or 0)
-        cooled_note = str(r["cooled_note"] or "").strip()
+        note_text = str(tour_note or "").strip()
+        cooled_flag = int(cooled_required or 0)
+        cooled_note = str(cooled_note or "").strip()
 
         if cooled_flag == 1:
             cool_msg = "Kühlware im Kühlschrank"
@@ -889,18 +1064,19 @@ def materialize_tours_to_departures(conn: sqlite3.Connection):
             note_text = f"{note_text} | {cool_msg}" if note_text else cool_msg
 
         for sid in screen_ids:
-            source_key = f"TOUR:{int(r['tour_id'])}:{int(r['position'])}:{sid}:{dep_dt.isoformat()}"
-            try:
-                execute_with_retry(cur, """
-                    INSERT INTO departures (datetime, location_id, vehicle, status, note, source_key, created_by, screen_id, countdown_enabled, cooled_required)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    dep_dt.isoformat(), int(r["location_id"]), "", "GEPLANT", note_text,
-                    source_key, "TOUR_AUTO", int(sid), int(r["tour_countdown_enabled"] or 0), cooled_flag
-                ))
-            except sqlite3.IntegrityError:
-                pass
+            source_key = f"TOUR:{int(tour_id)}:{int(position)}:{sid}:{dep_dt.isoformat()}"
+            rows.append((
+                dep_dt.isoformat(), int(location_id), "", "GEPLANT", note_text,
+                source_key, "TOUR_AUTO", int(sid), int(countdown_enabled or 0), cooled_flag
+            ))
 
+    if not rows:
+        return
+    # Doppelte source_key verwirft der eindeutige Index idx_departures_source_key.
+    executemany_with_retry(conn.cursor(), """
+        INSERT OR IGNORE INTO departures (datetime, location_id, vehicle, status, note, source_key, created_by, screen_id, countdown_enabled, cooled_required)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
     conn.commit()
 
 
@@ -909,54 +1085,47 @@ def materialize_holiday_tours_to_departures(conn: sqlite3.Connection):
         now = now_berlin()
         window_start = (now - timedelta(minutes=AUTO_COMPLETE_AFTER_MIN)).date()
         window_end = (now + timedelta(hours=MATERIALIZE_TOURS_HOURS_BEFORE)).date()
-        df = read_df(conn, """
-            SELECT h.id AS holiday_tour_id, h.holiday_date, h.hour, h.minute,
-                   h.note AS holiday_note, h.active AS holiday_active,
-                   h.screen_ids AS holiday_screen_ids,
-                   h.countdown_enabled AS holiday_countdown_enabled,
-                   h.cooled_required AS holiday_cooled_required,
-                   hs.location_id, hs.position, l.active AS location_active
+        stops = conn.execute("""
+            SELECT h.id, h.holiday_date, h.hour, h.minute, h.note, h.countdown_enabled,
+                   h.cooled_required, h.screen_ids, hs.location_id, hs.position
             FROM holiday_tours h
             JOIN holiday_tour_stops hs ON hs.holiday_tour_id = h.id
             JOIN locations l ON l.id = hs.location_id
-        """)
+            WHERE h.active = 1 AND l.active = 1
+        """).fetchall()
     except Exception as e:
         log_event(conn, "error", "holiday_materialize", details={"message": str(e)}, level="ERROR")
         return
 
-    if df.empty:
-        return
-
-    df = df[(df["holiday_active"] == 1) & (df["location_active"] == 1)].copy()
-    cur = conn.cursor()
+    rows = []
 
-    for _, r in df.iterrows():
+    for holiday_tour_id, holiday_date, hour, minute, holiday_note, countdown_enabled, cooled_required, holiday_screen_ids, location_id, position in stops:
         try:
-            holiday_date = pd.to_datetime(r["holiday_date"]).date()
+            holiday_date = pd.to_datetime(holiday_date).date()
         except Exception:
             continue
         if holiday_date < window_start or holiday_date > window_end:
             continue
-        screen_ids = parse_screen_ids(r["holiday_screen_ids"])
+        screen_ids = parse_screen_ids(holiday_screen_ids)
         if not screen_ids:
             continue
 
-        dep_dt = datetime.combine(holiday_date, dtime(hour=int(r["hour"]), minute=int(r["minute"]))).replace(tzinfo=TZ)
+        dep_dt = datetime.combine(holiday_date, dtime(hour=int(hour), minute=int(minute))).replace(tzinfo=TZ)
 
         for sid in screen_ids:
-            source_key = f"HOLIDAY:{int(r['holiday_tour_id'])}:{int(r['position'])}:{sid}:{dep_dt.isoformat()}"
-            try:
-                execute_with_retry(cur, """
-                    INSERT INTO departures (datetime, location_id, vehicle, status, note, source_key, created_by, screen_id, countdown_enabled, cooled_required)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    dep_dt.isoformat(), int(r["location_id"]), "", "GEPLANT", str(r["holiday_note"] or ""),
-                    source_key, "HOLIDAY_AUTO", int(sid), int(r["holiday_countdown_enabled"] or 0),
-                    int(r["holiday_cooled_required"] or 0)
-                ))
-            except sqlite3.IntegrityError:
-                pass
+            source_key = f"HOLIDAY:{int(holiday_tour_id)}:{int(position)}:{sid}:{dep_dt.isoformat()}"
+            rows.append((
+                dep_dt.isoformat(), int(location_id), "", "GEPLANT", str(holiday_note or ""),
+                source_key, "HOLIDAY_AUTO", int(sid), int(countdown_enabled or 0),
+                int(cooled_required or 0)
+            ))
 
+    if not rows:
+        return
+    executemany_with_retry(conn.cursor(), """
+        INSERT OR IGNORE INTO departures (datetime, location_id, vehicle, status, note, source_key, created_by, screen_id, countdown_enabled, cooled_required)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
     conn.commit()
 
 
@@ -976,23 +1145,11 @@ def create_manual_departures(conn, dep_dt: datetime, location_id: int, screen_id
 # MONITORANZEIGE
 # =========================================================
 def is_urgent_countdown(row) -> bool:
-    try:
-        if str(row.get("status") or "").upper() != "GEPLANT":
-            return False
-        remaining = ensure_tz(row.get("datetime")) - now_berlin()
-        return timedelta(0) <= remaining <= timedelta(minutes=BLINK_UNDER_MINUTES)
-    except Exception:
-        return False
+    return bool(row.get("countdown_urgent", False))
 
 
 def is_critical_countdown(row) -> bool:
-    try:
-        if str(row.get("status") or "").upper() != "GEPLANT":
-            return False
-        remaining = ensure_tz(row.get("datetime")) - now_berlin()
-        return timedelta(0) <= remaining <= timedelta(minutes=CRITICAL_UNDER_MINUTES)
-    except Exception:
-        return False
+    return bool(row.get("countdown_critical", False))
 
 
 def build_info_html(row) -> str:
@@ -1017,85 +1174,61 @@ def build_info_html(row) -> str:
     return " · ".join(parts)
 
 
-def get_screen_data(conn, screen_id: int):
-    screens = load_screens(conn)
-    if screens.empty or screen_id not in screens["id"].tolist():
+def get_screen_data(conn, screen_id: int, screens_by_id: dict | None = None):
+    if screens_by_id is None:
+        screens_by_id = load_screens_by_id(conn)
+    screen = screens_by_id.get(int(screen_id))
+    if screen is None:
         return None, pd.DataFrame()
 
-    screen = screens.loc[screens["id"] == screen_id].iloc[0]
     now = now_berlin()
     end = now + timedelta(hours=DISPLAY_WINDOW_HOURS)
     start = now - timedelta(minutes=AUTO_COMPLETE_AFTER_MIN)
 
-    deps = load_departures_with_locations(conn)
+    deps = load_screen_departures(conn, screen_id, screen.get("filter_type", "ALLE"), screen.get("filter_locations", ""), start, end)
     if deps.empty:
         return screen, pd.DataFrame()
 
-    deps = deps.copy()
-    deps = deps[deps["location_active"] == 1]
-    deps = deps[(deps["screen_id"].isna()) | (deps["screen_id"] == int(screen_id))]
-
-    if str(screen.get("filter_type", "ALLE")) != "ALLE":
-        deps = deps[deps["location_type"] == screen["filter_type"]]
-
-    filter_locations = str(screen.get("filter_locations", "") or "").strip()
-    if filter_locations:
-        ids = [int(x.strip()) for x in filter_locations.split(",") if x.strip().isdigit()]
-        if ids:
-            deps = deps[deps["location_id"].isin(ids)]
-
-    deps["datetime"] = pd.to_datetime(deps["datetime"], errors="coerce")
-    deps = deps.dropna(subset=["datetime"]).copy()
-    deps["datetime"] = deps["datetime"].apply(ensure_tz)
+    deps = deps.dropna(subset=["datetime"])
     deps = deps[(deps["datetime"] >= start) & (deps["datetime"] <= end)].copy()
 
     if deps.empty:
         return screen, deps
 
-    def visible(row):
-        status = str(row.get("status") or "").upper()
-        if status != "ABGESCHLOSSEN":
-            return True
-        ca = row.get("completed_at")
-        dep_dt = ensure_tz(row["datetime"])
-        base = ensure_tz(ca) if pd.notnull(ca) else completion_deadline(dep_dt)
-        return now <= base + timedelta(minutes=KEEP_COMPLETED_MINUTES)
-
-    deps = deps[deps.apply(visible, axis=1)].copy()
+    status = deps["status"].fillna("").astype(str).str.upper()
+    deadline = completion_deadline(deps["datetime"])
+    visible = (status != "ABGESCHLOSSEN") | (deps["completed_at"].fillna(deadline) + pd.Timedelta(minutes=KEEP_COMPLETED_MINUTES) >= now)
+    deps, status, deadline = deps[visible].copy(), status[visible], deadline[visible]
     if deps.empty:
         return screen, deps
 
-    def build_line_info(row):
-        if int(row.get("countdown_enabled", 1) or 1) != 1:
-            return ""
-        status = str(row.get("status") or "").upper()
-        dep_dt = ensure_tz(row["datetime"])
-        if status == "GEPLANT":
-            delta = dep_dt - now
-            if timedelta(0) <= delta <= timedelta(hours=COUNTDOWN_START_HOURS):
-                return f"Countdown: {fmt_compact(delta)}"
-            return ""
-        if status == "BEREIT":
-            return f"BEREIT · Abschluss in {fmt_compact(completion_deadline(dep_dt) - now)}"
-        return ""
-
-    deps["line_info"] = [build_line_info(r) for _, r in deps.iterrows()]
+    # Wie bisher gilt countdown_enabled=0 als Standardwert und damit als aktiv.
+    countdown = deps["countdown_enabled"].isin([0, 1])
+    delta = deps["datetime"] - now
+    upcoming = (status == "GEPLANT") & (delta >= pd.Timedelta(0))
+    deps["countdown_critical"] = upcoming & (delta <= pd.Timedelta(minutes=CRITICAL_UNDER_MINUTES))
+    deps["countdown_urgent"] = upcoming & (delta <= pd.Timedelta(minutes=BLINK_UNDER_MINUTES))
+    planned = countdown & upcoming & (delta <= pd.Timedelta(hours=COUNTDOWN_START_HOURS))
+    ready = countdown & (status == "BEREIT")
+    line_info = pd.Series("", index=deps.index, dtype=object)
+    line_info = line_info.mask(planned, "Countdown: " + fmt_compact_series(delta))
+    line_info = line_info.mask(ready, "BEREIT · Abschluss in " + fmt_compact_series(deadline - now))
+    deps["line_info"] = line_info
     deps = deps.sort_values(["datetime", "location_name"], na_position="last").copy()
     return screen, deps
 
 
-def is_next_departure(row, df: pd.DataFrame) -> bool:
+def next_departure_id(df: pd.DataFrame):
     try:
-        future = df[df["status"].fillna("").astype(str).str.upper().isin(["GEPLANT", "BEREIT"])].copy()
+        future = df[df["status"].fillna("").astype(str).str.upper().isin(["GEPLANT", "BEREIT"])]
         if future.empty:
-            return False
-        future = future.sort_values("datetime")
-        return int(row["id"]) == int(future.iloc[0]["id"])
+            return None
+        return int(future.loc[future["datetime"].idxmin(), "id"])
     except Exception:
-        return False
+        return None
 
 
-def get_row_display_styles(row, df: pd.DataFrame):
+def get_row_display_styles(row, next_id=None):
     base_bg = str(row.get("location_color") or "").strip()
     base_text = str(row.get("location_text_color") or "").strip()
     status = str(row.get("status") or "").upper()
@@ -1118,7 +1251,7 @@ def get_row_display_styles(row, df: pd.DataFrame):
     if cooled_required and not bg:
         bg = "#dbeafe"
         text = "#1e3a8a"
-    if is_next_departure(row, df):
+    if next_id is not None and int(row["id"]) == next_id:
         extra_css += "outline:4px solid #f59e0b; outline-offset:-4px;"
 
     return bg, text, extra_css
@@ -1128,19 +1261,21 @@ def build_display_rows(data: pd.DataFrame):
     rows, row_backgrounds, text_colors, extra_css = [], [], [], []
     if data is None or data.empty:
         return rows, row_backgrounds, text_colors, extra_css
-    for _, r in data.iterrows():
-        rows.append([ensure_tz(r["datetime"]).strftime("%H:%M"), r["location_name"], build_info_html(r)])
-        bg, tc, ex = get_row_display_styles(r, data)
+    next_id = next_departure_id(data)
+    times = data["datetime"].dt.strftime("%H:%M").tolist()
+    for time_text, r in zip(times, data.to_dict("records")):
+        rows.append([time_text, r["location_name"], build_info_html(r)])
+        bg, tc, ex = get_row_display_styles(r, next_id)
         row_backgrounds.append(bg)
         text_colors.append(tc)
         extra_css.append(ex)
     return rows, row_backgrounds, text_colors, extra_css
 
 
-def render_big_table_v2(headers, rows, row_backgrounds=None, text_colors=None, extra_row_css=None, html_cols=None):
+def build_big_table_html(headers, rows, row_backgrounds=None, text_colors=None, extra_row_css=None, html_cols=None) -> str:
     html_cols = set(html_cols or [])
     thead = "".join(f"<th>{escape_html(h)}</th>" for h in headers)
-    body = ""
+    body_parts = []
     for idx, r in enumerate(rows):
         style_parts = []
         if row_backgrounds and idx < len(row_backgrounds) and row_backgrounds[idx]:
@@ -1153,14 +1288,18 @@ def render_big_table_v2(headers, rows, row_backgrounds=None, text_colors=None, e
         cells = []
         for cidx, c in enumerate(r):
             cells.append(f"<td>{c or ''}</td>" if cidx in html_cols else f"<td>{escape_html(str(c or ''))}</td>")
-        body += f"<tr{style}>{''.join(cells)}</tr>"
+        body_parts.append(f"<tr{style}>{''.join(cells)}</tr>")
 
-    st.markdown(f"""
+    return f"""
 <table class="big-table">
   <thead><tr>{thead}</tr></thead>
-  <tbody>{body}</tbody>
+  <tbody>{"".join(body_parts)}</tbody>
 </table>
-""", unsafe_allow_html=True)
+"""
+
+
+def render_big_table_v2(headers, rows, row_backgrounds=None, text_colors=None, extra_row_css=None, html_cols=None):
+    st.markdown(build_big_table_html(headers, rows, row_backgrounds, text_colors, extra_row_css, html_cols), unsafe_allow_html=True)
 
 
 def render_display_header(title: str | None = None, data: pd.DataFrame | None = None):
@@ -1247,51 +1386,57 @@ document.addEventListener("selectstart", function(e) { e.preventDefault(); });
 """, unsafe_allow_html=True)
 
 
-def get_combined_ticker_text(conn, screen_ids: list[int]) -> str:
+def get_combined_ticker_text(conn, screen_ids: list[int], screens_by_id: dict | None = None) -> str:
     texts = []
-    screens = load_screens(conn)
+    if screens_by_id is None:
+        screens_by_id = load_screens_by_id(conn)
     for sid in screen_ids:
-        row = screens.loc[screens["id"] == sid]
-        if row.empty:
+        row = screens_by_id.get(int(sid))
+        if row is None:
             continue
-        text = str(row.iloc[0].get("text") or "").strip()
-        active = bool(int(row.iloc[0].get("ticker_active") or 0))
+        text = str(row.get("text") or "").strip()
+        active = bool(int(row.get("ticker_active") or 0))
         if active and text:
             texts.append(text)
     return "   ✦   ".join(dict.fromkeys(texts))
 
 
-def render_zone_overview_screen(conn, screen_id: int):
-    screens = load_screens(conn)
-    screen_row = screens.loc[screens["id"] == int(screen_id)].iloc[0]
+def render_zone_overview_screen(conn, screen_id: int, screens_by_id: dict | None = None):
+    if screens_by_id is None:
+        screens_by_id = load_screens_by_id(conn)
+    screen_row = screens_by_id[int(screen_id)]
     zone_ids = OVERVIEW_GROUPS.get(int(screen_id), [1, 2, 3, 4, 8, 9])
     all_rows, row_backgrounds, text_colors, extra_css, combined_df_parts = [], [], [], [], []
     for zid in zone_ids:
-        _, zone_data = get_screen_data(conn, zid)
+        _, zone_data = get_screen_data(conn, zid, screens_by_id)
         zone_name = ZONE_NAME_MAP.get(zid, f"Zone {zid}")
         if zone_data is None or zone_data.empty:
             continue
-        combined_df_parts.append(zone_data.copy())
-        for _, r in zone_data.iterrows():
-            all_rows.append([ensure_tz(r["datetime"]).strftime("%H:%M"), r["location_name"], zone_name, build_info_html(r)])
-            bg, tc, ex = get_row_display_styles(r, zone_data)
+        combined_df_parts.append(zone_data)
+        next_id = next_departure_id(zone_data)
+        times = zone_data["datetime"].dt.strftime("%H:%M").tolist()
+        for time_text, r in zip(times, zone_data.to_dict("records")):
+            all_rows.append([time_text, r["location_name"], zone_name, build_info_html(r)])
+            bg, tc, ex = get_row_display_styles(r, next_id)
             row_backgrounds.append(bg); text_colors.append(tc); extra_css.append(ex)
     combined_df = pd.concat(combined_df_parts, ignore_index=True) if combined_df_parts else pd.DataFrame()
     render_display_header(f"{screen_row['name']} (Screen {screen_id})", combined_df)
-    st.markdown("<div class='zone-overview-card'>", unsafe_allow_html=True)
     if not all_rows:
         st.info("Keine Abfahrten im Zeitfenster.")
     else:
-        render_big_table_v2(["Zeit", "Einrichtung", "Zone", "Hinweis / Countdown"], all_rows, row_backgrounds, text_colors, extra_css, html_cols={3})
-    st.markdown("</div>", unsafe_allow_html=True)
-    ticker_text = get_combined_ticker_text(conn, zone_ids)
+        table_html = build_big_table_html(["Zeit", "Einrichtung", "Zone", "Hinweis / Countdown"], all_rows, row_backgrounds, text_colors, extra_css, html_cols={3})
+        st.markdown(f"<div class='zone-overview-card'>{table_html}</div>", unsafe_allow_html=True)
+    ticker_text = get_combined_ticker_text(conn, zone_ids, screens_by_id)
     if ticker_text:
         st.markdown(f"<div class='ticker'><div class='ticker__inner'>{escape_html(ticker_text)}</div></div>", unsafe_allow_html=True)
+    return combined_df
 
 
-def render_split_screen(conn, left_screen_id: int, right_screen_id: int, title: str):
-    left_screen, left_data = get_screen_data(conn, left_screen_id)
-    right_screen, right_data = get_screen_data(conn, right_screen_id)
+def render_split_screen(conn, left_screen_id: int, right_screen_id: int, title: str, screens_by_id: dict | None = None):
+    if screens_by_id is None:
+        screens_by_id = load_screens_by_id(conn)
+    left_screen, left_data = get_screen_data(conn, left_screen_id, screens_by_id)
+    right_screen, right_data = get_screen_data(conn, right_screen_id, screens_by_id)
     left_zone_name = ZONE_NAME_MAP.get(left_screen_id, left_screen["name"] if left_screen is not None else f"Screen {left_screen_id}")
     right_zone_name = ZONE_NAME_MAP.get(right_screen_id, right_screen["name"] if right_screen is not None else f"Screen {right_screen_id}")
     combined_parts = []
@@ -1301,18 +1446,42 @@ def render_split_screen(conn, left_screen_id: int, right_screen_id: int, title:
     render_display_header(title, combined_df)
     col1, col2 = st.columns(2)
     for col, zone_name, data in [(col1, left_zone_name, left_data), (col2, right_zone_name, right_data)]:
-        with col:
-            st.markdown("<div class='split-monitor-card'>", unsafe_allow_html=True)
-            st.markdown(f"<div class='split-zone-title'>{escape_html(zone_name)}</div>", unsafe_allow_html=True)
-            if data is None or data.empty:
-                st.markdown("<div class='split-empty'>Keine Abfahrten im Zeitfenster.</div>", unsafe_allow_html=True)
-            else:
-                rows, rb, tc, ex = build_display_rows(data)
-                render_big_table_v2(["Zeit", "Einrichtung", "Hinweis / Countdown"], rows, rb, tc, ex, html_cols={2})
-            st.markdown("</div>", unsafe_allow_html=True)
-    ticker_text = get_combined_ticker_text(conn, [left_screen_id, right_screen_id])
+        html_parts = ["<div class='split-monitor-card'>", f"<div class='split-zone-title'>{escape_html(zone_name)}</div>"]
+        if data is None or data.empty:
+            html_parts.append("<div class='split-empty'>Keine Abfahrten im Zeitfenster.</div>")
+        else:
+            rows, rb, tc, ex = build_display_rows(data)
+            html_parts.append(build_big_table_html(["Zeit", "Einrichtung", "Hinweis / Countdown"], rows, rb, tc, ex, html_cols={2}))
+        html_parts.append("</div>")
+        col.markdown("".join(html_parts), unsafe_allow_html=True)
+    ticker_text = get_combined_ticker_text(conn, [left_screen_id, right_screen_id], screens_by_id)
     if ticker_text:
         st.markdown(f"<div class='ticker'><div class='ticker__inner'>{escape_html(ticker_text)}</div></div>", unsafe_allow_html=True)
+    return combined_df
+
+
+def departures_signature(data: pd.DataFrame | None) -> int:
+    if data is None or data.empty:
+        return 0
+    # line_info und die Dringlichkeits-Flags gehören dazu, sonst gilt ein laufender Countdown als unverändert
+    cols = [c for c in ["id", "status", "datetime", "note", "cooled_required", "line_info", "countdown_urgent", "countdown_critical"] if c in data.columns]
+    return hash(tuple(data[cols].astype(str).itertuples(index=False, name=None)))
+
+
+def track_display_signature(screen_id: int, data: pd.DataFrame | None):
+    key = f"refresh_backoff_{screen_id}"
+    signature = departures_signature(data)
+    last_signature, unchanged = st.session_state.get(key, (None, 0))
+    st.session_state[key] = (signature, unchanged + 1 if signature == last_signature else 0)
+
+
+def display_refresh_interval_ms(screen_id: int, base_seconds: int) -> int:
+    # Bleiben die Daten mehrere Abfragen lang unverändert, wird seltener aktualisiert (max. REFRESH_BACKOFF_MAX_FACTOR).
+    _, unchanged = st.session_state.get(f"refresh_backoff_{screen_id}", (None, 0))
+    factor = 1
+    if unchanged >= REFRESH_BACKOFF_AFTER_POLLS:
+        factor = min(2 ** (unchanged - REFRESH_BACKOFF_AFTER_POLLS + 1), REFRESH_BACKOFF_MAX_FACTOR)
+    return int(base_seconds) * factor * 1000
 
 
 # =========================================================
@@ -1324,8 +1493,7 @@ def calc_delivery_slots(gitterwagen: int, paletten: int, extra_long_paletten: in
 
 def next_delivery_note_number(conn) -> str:
     today = now_berlin().strftime("%Y%m%d")
-    df = read_df(conn, "SELECT COUNT(*) AS c FROM delivery_note_headers WHERE created_at LIKE ?", (f"{now_berlin().date().isoformat()}%",))
-    num = int(df.iloc[0]["c"]) + 1 if not df.empty else 1
+    num = conn.execute("SELECT COUNT(*) FROM delivery_note_headers WHERE created_at LIKE ?", (f"{now_berlin().date().isoformat()}%",)).fetchone()[0] + 1
     return f"FB-{today}-{num:03d}"
 
 
@@ -1355,13 +1523,13 @@ def load_delivery_note_items(conn, header_id: int):
 
 def create_delivery_note_from_tour(conn, delivery_date, tour_id: int, truck_name: str = "", driver_name: str = "", comment: str = "") -> int:
     cur = conn.cursor()
-    existing = read_df(conn, """
+    existing = cur.execute("""
         SELECT id FROM delivery_note_headers
         WHERE delivery_date = ? AND tour_id = ?
         ORDER BY id DESC LIMIT 1
-    """, (delivery_date.isoformat(), int(tour_id)))
-    if not existing.empty:
-        return int(existing.iloc[0]["id"])
+    """, (delivery_date.isoformat(), int(tour_id))).fetchone()
+    if existing is not None:
+        return int(existing[0])
 
     note_number = next_delivery_note_number(conn)
     cur.execute("""
@@ -1893,11 +2061,8 @@ def require_login():
 # =========================================================
 def show_admin_departures(conn, can_edit: bool):
     st.subheader("Abfahrten")
-    materialize_tours_to_departures(conn)
-    materialize_holiday_tours_to_departures(conn)
-    update_departure_statuses(conn)
 
-    deps = load_departures_with_locations().sort_values("datetime") if False else load_departures_with_locations(conn).sort_values("datetime")
+    deps = load_departures_with_locations(conn)
 
     with st.expander("Filter / Suche", expanded=True):
         c1, c2, c3, c4 = st.columns(4)
@@ -1930,26 +2095,31 @@ def show_admin_departures(conn, can_edit: bool):
         if cold_only:
             view = view[view["cooled_required"] == 1]
 
-        view["Quelle"] = view["source_key"].astype(str).apply(
-            lambda s: "TOUR" if s.startswith("TOUR:") else ("FEIERTAG" if s.startswith("HOLIDAY:") else ("MANUELL" if s.startswith("MANUAL:") else "SONST"))
+        source = view["source_key"].fillna("").astype(str)
+        view["Quelle"] = (
+            pd.Series("SONST", index=view.index, dtype=object)
+            .mask(source.str.startswith("MANUAL:"), "MANUELL")
+            .mask(source.str.startswith("HOLIDAY:"), "FEIERTAG")
+            .mask(source.str.startswith("TOUR:"), "TOUR")
         )
-        view["Zeit"] = view["datetime"].apply(lambda d: ensure_tz(d).strftime("%d.%m.%Y %H:%M") if pd.notnull(d) else "")
+        view["Zeit"] = view["datetime"].dt.strftime("%d.%m.%Y %H:%M").fillna("")
         st.dataframe(view[["id", "Zeit", "screen_id", "location_name", "note", "status", "countdown_enabled", "cooled_required", "Quelle"]], use_container_width=True, height=320)
 
     if not can_edit:
         return
 
     locations = load_locations(conn)
+    location_names = dict(zip(locations["id"].tolist(), locations["name"].tolist()))
     screens = load_screens(conn)
     st.markdown("### Neue manuelle Abfahrt")
     with st.form("manual_dep_form"):
         c1, c2, c3 = st.columns(3)
         with c1:
-            loc_id = st.selectbox("Einrichtung", locations["id"].tolist(), format_func=lambda i: locations.loc[locations["id"] == i, "name"].values[0])
+            loc_id = st.selectbox("Einrichtung", locations["id"].tolist(), format_func=lambda i: location_names[i])
             note = st.text_input("Hinweis")
         with c2:
             dep_date = st.date_input("Datum", value=now_berlin().date())
-            dep_time = st.selectbox("Uhrzeit", time_options_half_hour(), index=time_options_half_hour().index("08:00"))
+            dep_time = st.selectbox("Uhrzeit", TIME_OPTIONS_HALF_HOUR, index=TIME_OPTION_INDEX["08:00"])
         with c3:
             screen_ids = st.multiselect("Screens", options=screens["id"].tolist(), default=[1])
             countdown_enabled = st.checkbox("Countdown aktiv", True)
@@ -1959,7 +2129,8 @@ def show_admin_departures(conn, can_edit: bool):
     if submitted and screen_ids:
         hh, mm = map(int, dep_time.split(":"))
         dep_dt = datetime.combine(dep_date, dtime(hour=hh, minute=mm)).replace(tzinfo=TZ)
-        create_manual_departures(conn, dep_dt, int(loc_id), [int(s) for s in screen_ids], note, str(st.session_state.get("username") or "ADMIN"), countdown_enabled, cooled_required)
+        with writer() as conn:
+            create_manual_departures(conn, dep_dt, int(loc_id), [int(s) for s in screen_ids], note, str(st.session_state.get("username") or "ADMIN"), countdown_enabled, cooled_required)
         save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Gespeichert.")
         st.rerun()
@@ -1979,7 +2150,7 @@ def show_admin_locations(conn, can_edit: bool):
         c1, c2, c3 = st.columns(3)
         with c1:
             name = st.text_input("Name")
-            typ = st.selectbox("Typ", ["KRANKENHAUS", "ALTENHEIM", "MVZ"])
+            typ = st.selectbox("Typ", LOCATION_TYPES)
             active = st.checkbox("Aktiv", True)
         with c2:
             street = st.text_input("Straße")
@@ -1991,11 +2162,13 @@ def show_admin_locations(conn, can_edit: bool):
         submitted = st.form_submit_button("Speichern")
 
     if submitted and name.strip():
-        conn.execute(
-            "INSERT INTO locations (name, type, active, color, text_color, street, postal_code, city) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (name.strip(), typ, 1 if active else 0, color, text_color, street.strip(), postal_code.strip(), city.strip())
-        )
-        conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+        with writer() as conn:
+            conn.execute(
+                "INSERT INTO locations (name, type, active, color, text_color, street, postal_code, city) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name.strip(), typ, 1 if active else 0, color, text_color, street.strip(), postal_code.strip(), city.strip())
+            )
+            conn.commit()
+        clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Einrichtung gespeichert.")
         st.rerun()
 
@@ -2004,13 +2177,13 @@ def show_admin_locations(conn, can_edit: bool):
 
     st.markdown("### Einrichtung bearbeiten / löschen")
     selected = st.selectbox("Einrichtung auswählen", locations["id"].tolist(), key="edit_location_select")
-    row = locations.loc[locations["id"] == selected].iloc[0]
+    row = locations.set_index("id", drop=False).loc[selected]
 
     with st.form("edit_location_form"):
         c1, c2, c3 = st.columns(3)
         with c1:
             edit_name = st.text_input("Name", row["name"])
-            edit_type = st.selectbox("Typ", ["KRANKENHAUS", "ALTENHEIM", "MVZ"], index=["KRANKENHAUS", "ALTENHEIM", "MVZ"].index(row["type"]) if row["type"] in ["KRANKENHAUS", "ALTENHEIM", "MVZ"] else 0)
+            edit_type = st.selectbox("Typ", LOCATION_TYPES, index=LOCATION_TYPES.index(row["type"]) if row["type"] in LOCATION_TYPES else 0)
             edit_active = st.checkbox("Aktiv", bool(row["active"]))
         with c2:
             edit_street = st.text_input("Straße", str(row.get("street") or ""))
@@ -2024,32 +2197,38 @@ def show_admin_locations(conn, can_edit: bool):
         delete = cdel.form_submit_button("Löschen")
 
     if save and edit_name.strip():
-        conn.execute(
-            "UPDATE locations SET name=?, type=?, active=?, color=?, text_color=?, street=?, postal_code=?, city=? WHERE id=?",
-            (edit_name.strip(), edit_type, 1 if edit_active else 0, edit_color, edit_text_color, edit_street.strip(), edit_postal_code.strip(), edit_city.strip(), int(selected))
-        )
-        conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+        with writer() as conn:
+            conn.execute(
+                "UPDATE locations SET name=?, type=?, active=?, color=?, text_color=?, street=?, postal_code=?, city=? WHERE id=?",
+                (edit_name.strip(), edit_type, 1 if edit_active else 0, edit_color, edit_text_color, edit_street.strip(), edit_postal_code.strip(), edit_city.strip(), int(selected))
+            )
+            conn.commit()
+        clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Aktualisiert.")
         st.rerun()
 
     if delete:
         try:
-            conn.execute("DELETE FROM locations WHERE id=?", (int(selected),))
-            conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+            # Scheitert der Fremdschlüssel-Check, rollt writer() zurück
+            with writer() as conn:
+                conn.execute("DELETE FROM locations WHERE id=?", (int(selected),))
+                conn.commit()
+            clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
             st.success("Gelöscht.")
             st.rerun()
         except Exception as e:
             st.error(str(e))
 
 
-def export_tours_csv(conn):
-    tours_df = read_df(conn, """
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def export_tours_csv(_conn):
+    tours_df = read_df(_conn, """
         SELECT t.id, t.name, t.weekday, t.hour, t.minute, t.location_id, l.name AS location_name,
                t.note, t.active, t.screen_ids, t.countdown_enabled, t.cooled_required
         FROM tours t LEFT JOIN locations l ON l.id = t.location_id
         ORDER BY t.id
     """)
-    stops_df = read_df(conn, """
+    stops_df = read_df(_conn, """
         SELECT ts.id, ts.tour_id, t.name AS tour_name, ts.position, ts.location_id, l.name AS location_name,
                ts.cooled_required, ts.cooled_note
         FROM tour_stops ts
@@ -2078,7 +2257,7 @@ def show_admin_tours(conn, can_edit: bool):
             view = view[view["name"].fillna("").astype(str).str.lower().str.contains(q) | view["note"].fillna("").astype(str).str.lower().str.contains(q)]
         if weekday_filter != "ALLE":
             view = view[view["weekday"] == weekday_filter]
-        view["Zeit"] = view.apply(lambda r: f"{int(r['hour']):02d}:{int(r['minute']):02d}", axis=1)
+        view["Zeit"] = view["hour"].astype(int).astype(str).str.zfill(2) + ":" + view["minute"].astype(int).astype(str).str.zfill(2)
         st.dataframe(view[["id", "name", "weekday", "Zeit", "countdown_enabled", "cooled_required", "location_name", "note", "active", "screen_ids"]], use_container_width=True, height=280)
     else:
         st.info("Noch keine Touren vorhanden.")
@@ -2094,6 +2273,7 @@ def show_admin_tours(conn, can_edit: bool):
         return
 
     locations = load_locations(conn)
+    location_names = dict(zip(locations["id"].tolist(), locations["name"].tolist()))
     screens = load_screens(conn)
 
     st.markdown("### Neue Tour")
@@ -2103,18 +2283,18 @@ def show_admin_tours(conn, can_edit: bool):
             tour_name = st.text_input("Tour-Name")
             weekday = st.selectbox("Wochentag", WEEKDAYS_DE)
         with c2:
-            time_label = st.selectbox("Uhrzeit", time_options_half_hour(), index=time_options_half_hour().index("08:00"))
+            time_label = st.selectbox("Uhrzeit", TIME_OPTIONS_HALF_HOUR, index=TIME_OPTION_INDEX["08:00"])
         with c3:
             screens_new = st.multiselect("Monitore", options=screens["id"].tolist())
         countdown_enabled = st.checkbox("Countdown aktiv", False)
         active_new = st.checkbox("Aktiv", True)
-        stops_new = st.multiselect("Stops", options=locations["id"].tolist(), format_func=lambda i: locations.loc[locations["id"] == i, "name"].values[0])
+        stops_new = st.multiselect("Stops", options=locations["id"].tolist(), format_func=lambda i: location_names[i])
         note_new = st.text_input("Hinweis")
 
         st.markdown("#### Kühlware pro Stop")
         new_cool_flags, new_cool_notes = {}, {}
         for loc_id in stops_new:
-            loc_name = locations.loc[locations["id"] == loc_id, "name"].values[0]
+            loc_name = location_names[loc_id]
             st.markdown(f"**{loc_name}**")
             c_a, c_b = st.columns(2)
             with c_a:
@@ -2126,21 +2306,23 @@ def show_admin_tours(conn, can_edit: bool):
 
     if submitted and tour_name.strip() and screens_new and stops_new:
         hh, mm = map(int, time_label.split(":"))
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO tours (name, weekday, hour, minute, location_id, note, active, screen_ids, countdown_enabled, cooled_required) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                tour_name.strip(), weekday, hh, mm, int(stops_new[0]), note_new.strip(), 1 if active_new else 0,
-                ",".join(map(str, screens_new)), 1 if countdown_enabled else 0, 1 if any(bool(v) for v in new_cool_flags.values()) else 0,
-            ),
-        )
-        tour_id = cur.lastrowid
-        for pos, loc_id in enumerate(stops_new):
+        # Tour und Stopps in einer Transaktion, ohne fremde Commits auf der geteilten Verbindung
+        with writer() as conn:
+            cur = conn.cursor()
             cur.execute(
+                "INSERT INTO tours (name, weekday, hour, minute, location_id, note, active, screen_ids, countdown_enabled, cooled_required) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    tour_name.strip(), weekday, hh, mm, int(stops_new[0]), note_new.strip(), 1 if active_new else 0,
+                    ",".join(map(str, screens_new)), 1 if countdown_enabled else 0, 1 if any(bool(v) for v in new_cool_flags.values()) else 0,
+                ),
+            )
+            tour_id = cur.lastrowid
+            cur.executemany(
                 "INSERT INTO tour_stops (tour_id, location_id, position, cooled_required, cooled_note) VALUES (?, ?, ?, ?, ?)",
-                (int(tour_id), int(loc_id), pos, 1 if new_cool_flags.get(int(loc_id), False) else 0, str(new_cool_notes.get(int(loc_id), "") or "").strip())
+                [(int(tour_id), int(loc_id), pos, 1 if new_cool_flags.get(int(loc_id), False) else 0, str(new_cool_notes.get(int(loc_id), "") or "").strip()) for pos, loc_id in enumerate(stops_new)]
             )
-        conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+            conn.commit()
+        clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Tour gespeichert.")
         st.rerun()
 
@@ -2148,17 +2330,16 @@ def show_admin_tours(conn, can_edit: bool):
         return
 
     st.markdown("### Tour bearbeiten / löschen")
-    selected_tour_id = st.selectbox("Tour auswählen", tours["id"].tolist(), format_func=lambda i: f"{int(i)} – {tours.loc[tours['id'] == i, 'name'].iloc[0]}", key="edit_tour_select")
-    tour_row = tours.loc[tours["id"] == selected_tour_id].iloc[0]
+    tour_names = dict(zip(tours["id"].tolist(), tours["name"].tolist()))
+    selected_tour_id = st.selectbox("Tour auswählen", tours["id"].tolist(), format_func=lambda i: f"{int(i)} – {tour_names[i]}", key="edit_tour_select")
+    tour_row = tours.set_index("id", drop=False).loc[selected_tour_id]
     stops_df = load_tour_stops(conn, int(selected_tour_id))
     current_stop_ids = stops_df["location_id"].astype(int).tolist() if not stops_df.empty else []
     current_screen_ids = parse_screen_ids(tour_row.get("screen_ids"))
-    current_stop_map = {int(r["location_id"]): {"cooled_required": int(r.get("cooled_required", 0) or 0), "cooled_note": str(r.get("cooled_note") or "")} for _, r in stops_df.iterrows()}
+    current_stop_map = {int(r["location_id"]): {"cooled_required": int(r.get("cooled_required", 0) or 0), "cooled_note": str(r.get("cooled_note") or "")} for r in stops_df.to_dict("records")}
 
-    weekday_index = WEEKDAYS_DE.index(tour_row["weekday"]) if tour_row["weekday"] in WEEKDAYS_DE else 0
-    current_time = f"{int(tour_row['hour']):02d}:{int(tour_row['minute']):02d}"
-    time_options = time_options_half_hour()
-    time_index = time_options.index(current_time) if current_time in time_options else 0
+    weekday_index = WEEKDAY_TO_INT.get(tour_row["weekday"], 0)
+    time_index = TIME_OPTION_INDEX.get(f"{int(tour_row['hour']):02d}:{int(tour_row['minute']):02d}", 0)
 
     with st.form("edit_tour_form"):
         c1, c2, c3 = st.columns(3)
@@ -2166,19 +2347,19 @@ def show_admin_tours(conn, can_edit: bool):
             edit_tour_name = st.text_input("Tour-Name", value=str(tour_row["name"]))
             edit_weekday = st.selectbox("Wochentag", WEEKDAYS_DE, index=weekday_index)
         with c2:
-            edit_time_label = st.selectbox("Uhrzeit", time_options, index=time_index)
+            edit_time_label = st.selectbox("Uhrzeit", TIME_OPTIONS_HALF_HOUR, index=time_index)
             edit_screens = st.multiselect("Monitore", options=screens["id"].tolist(), default=current_screen_ids)
         with c3:
             edit_countdown_enabled = st.checkbox("Countdown aktiv", value=bool(int(tour_row.get("countdown_enabled", 0) or 0)))
             edit_active = st.checkbox("Aktiv", value=bool(int(tour_row.get("active", 1) or 1)))
 
-        edit_stops = st.multiselect("Stops", options=locations["id"].tolist(), default=current_stop_ids, format_func=lambda i: locations.loc[locations["id"] == i, "name"].values[0])
+        edit_stops = st.multiselect("Stops", options=locations["id"].tolist(), default=current_stop_ids, format_func=lambda i: location_names[i])
         edit_note = st.text_input("Hinweis", value=str(tour_row["note"] or ""))
 
         st.markdown("#### Kühlware pro Stop")
         edit_cool_flags, edit_cool_notes = {}, {}
         for loc_id in edit_stops:
-            loc_name = locations.loc[locations["id"] == loc_id, "name"].values[0]
+            loc_name = location_names[loc_id]
             current_cfg = current_stop_map.get(int(loc_id), {"cooled_required": 0, "cooled_note": ""})
             st.markdown(f"**{loc_name}**")
             c_a, c_b = st.columns(2)
@@ -2200,49 +2381,53 @@ def show_admin_tours(conn, can_edit: bool):
             st.error("Mindestens ein Stop muss gewählt werden.")
         else:
             hh, mm = map(int, edit_time_label.split(":"))
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE tours
-                SET name=?, weekday=?, hour=?, minute=?, location_id=?, note=?, active=?, screen_ids=?, countdown_enabled=?, cooled_required=?
-                WHERE id=?
-            """, (
-                edit_tour_name.strip(), edit_weekday, hh, mm, int(edit_stops[0]), edit_note.strip(),
-                1 if edit_active else 0, ",".join(map(str, edit_screens)), 1 if edit_countdown_enabled else 0,
-                1 if any(bool(v) for v in edit_cool_flags.values()) else 0, int(selected_tour_id),
-            ))
-            cur.execute("DELETE FROM tour_stops WHERE tour_id=?", (int(selected_tour_id),))
-            for pos, loc_id in enumerate(edit_stops):
-                cur.execute(
+            with writer() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE tours
+                    SET name=?, weekday=?, hour=?, minute=?, location_id=?, note=?, active=?, screen_ids=?, countdown_enabled=?, cooled_required=?
+                    WHERE id=?
+                """, (
+                    edit_tour_name.strip(), edit_weekday, hh, mm, int(edit_stops[0]), edit_note.strip(),
+                    1 if edit_active else 0, ",".join(map(str, edit_screens)), 1 if edit_countdown_enabled else 0,
+                    1 if any(bool(v) for v in edit_cool_flags.values()) else 0, int(selected_tour_id),
+                ))
+                cur.execute("DELETE FROM tour_stops WHERE tour_id=?", (int(selected_tour_id),))
+                cur.executemany(
                     "INSERT INTO tour_stops (tour_id, location_id, position, cooled_required, cooled_note) VALUES (?, ?, ?, ?, ?)",
-                    (int(selected_tour_id), int(loc_id), pos, 1 if edit_cool_flags.get(int(loc_id), False) else 0, str(edit_cool_notes.get(int(loc_id), "") or "").strip())
+                    [(int(selected_tour_id), int(loc_id), pos, 1 if edit_cool_flags.get(int(loc_id), False) else 0, str(edit_cool_notes.get(int(loc_id), "") or "").strip()) for pos, loc_id in enumerate(edit_stops)]
                 )
-            conn.execute("DELETE FROM departures WHERE source_key LIKE ?", (f"TOUR:{int(selected_tour_id)}:%",))
-            conn.commit()
-            materialize_tours_to_departures(conn); update_departure_statuses(conn); save_backup_to_dir(conn); cleanup_old_backups()
+                conn.execute("DELETE FROM departures WHERE source_key LIKE ?", (f"TOUR:{int(selected_tour_id)}:%",))
+                conn.commit()
+            clear_load_caches()
+            run_departure_maintenance(); save_backup_to_dir(conn); cleanup_old_backups()
             st.success("Tour aktualisiert.")
             st.rerun()
 
     if delete_tour:
         try:
-            cur = conn.cursor()
-            cur.execute("DELETE FROM tour_stops WHERE tour_id=?", (int(selected_tour_id),))
-            cur.execute("DELETE FROM tours WHERE id=?", (int(selected_tour_id),))
-            cur.execute("DELETE FROM departures WHERE source_key LIKE ?", (f"TOUR:{int(selected_tour_id)}:%",))
-            conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+            with writer() as conn:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM tour_stops WHERE tour_id=?", (int(selected_tour_id),))
+                cur.execute("DELETE FROM tours WHERE id=?", (int(selected_tour_id),))
+                cur.execute("DELETE FROM departures WHERE source_key LIKE ?", (f"TOUR:{int(selected_tour_id)}:%",))
+                conn.commit()
+            clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
             st.success("Tour gelöscht.")
             st.rerun()
         except Exception as e:
             st.error(str(e))
 
 
-def export_holiday_tours_csv(conn):
-    holiday_tours_df = read_df(conn, """
+@st.cache_data(ttl=LOAD_CACHE_TTL_SECONDS, show_spinner=False)
+def export_holiday_tours_csv(_conn):
+    holiday_tours_df = read_df(_conn, """
         SELECT h.id, h.name, h.holiday_date, h.hour, h.minute, h.location_id, l.name AS location_name,
                h.note, h.active, h.screen_ids, h.countdown_enabled, h.cooled_required
         FROM holiday_tours h LEFT JOIN locations l ON l.id = h.location_id
         ORDER BY h.holiday_date, h.hour, h.minute, h.name
     """)
-    holiday_stops_df = read_df(conn, """
+    holiday_stops_df = read_df(_conn, """
         SELECT hs.id, hs.holiday_tour_id, h.name AS holiday_tour_name, hs.position, hs.location_id, l.name AS location_name
         FROM holiday_tour_stops hs
         JOIN holiday_tours h ON h.id = hs.holiday_tour_id
@@ -2270,7 +2455,7 @@ def show_admin_holiday_tours(conn, can_edit: bool):
             view = view[view["name"].fillna("").astype(str).str.lower().str.contains(q) | view["note"].fillna("").astype(str).str.lower().str.contains(q)]
         if date_filter.strip():
             view = view[view["holiday_date"].fillna("").astype(str).str.contains(date_filter.strip(), regex=False)]
-        view["Zeit"] = view.apply(lambda r: f"{int(r['hour']):02d}:{int(r['minute']):02d}", axis=1)
+        view["Zeit"] = view["hour"].astype(int).astype(str).str.zfill(2) + ":" + view["minute"].astype(int).astype(str).str.zfill(2)
         st.dataframe(view[["id", "name", "holiday_date", "Zeit", "countdown_enabled", "cooled_required", "location_name", "note", "active", "screen_ids"]], use_container_width=True, height=300)
     else:
         st.info("Noch keine Feiertagsbelieferungen vorhanden.")
@@ -2286,6 +2471,7 @@ def show_admin_holiday_tours(conn, can_edit: bool):
         return
 
     locations = load_locations(conn)
+    location_names = dict(zip(locations["id"].tolist(), locations["name"].tolist()))
     screens = load_screens(conn)
 
     st.markdown("### Neue Feiertagsbelieferung")
@@ -2295,28 +2481,29 @@ def show_admin_holiday_tours(conn, can_edit: bool):
             holiday_name = st.text_input("Name")
             holiday_date = st.date_input("Datum")
         with c2:
-            holiday_time = st.selectbox("Uhrzeit", time_options_half_hour(), index=time_options_half_hour().index("08:00"))
+            holiday_time = st.selectbox("Uhrzeit", TIME_OPTIONS_HALF_HOUR, index=TIME_OPTION_INDEX["08:00"])
         with c3:
             holiday_screens = st.multiselect("Monitore", options=screens["id"].tolist())
         holiday_countdown = st.checkbox("Countdown aktiv", False)
         holiday_cooled = st.checkbox("Kühlware mitzunehmen", False)
-        holiday_stops = st.multiselect("Stops", options=locations["id"].tolist(), format_func=lambda i: locations.loc[locations["id"] == i, "name"].values[0])
+        holiday_stops = st.multiselect("Stops", options=locations["id"].tolist(), format_func=lambda i: location_names[i])
         holiday_note = st.text_input("Hinweis")
         holiday_active = st.checkbox("Aktiv", True)
         create_holiday = st.form_submit_button("Speichern")
 
     if create_holiday and holiday_name.strip() and holiday_screens and holiday_stops:
         hh, mm = map(int, holiday_time.split(":"))
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO holiday_tours
-            (name, holiday_date, hour, minute, location_id, note, active, screen_ids, countdown_enabled, cooled_required)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (holiday_name.strip(), holiday_date.isoformat(), hh, mm, int(holiday_stops[0]), holiday_note.strip(), 1 if holiday_active else 0, ",".join(map(str, holiday_screens)), 1 if holiday_countdown else 0, 1 if holiday_cooled else 0))
-        holiday_tour_id = cur.lastrowid
-        for pos, loc_id in enumerate(holiday_stops):
-            cur.execute("INSERT INTO holiday_tour_stops (holiday_tour_id, location_id, position) VALUES (?, ?, ?)", (holiday_tour_id, int(loc_id), pos))
-        conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+        with writer() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO holiday_tours
+                (name, holiday_date, hour, minute, location_id, note, active, screen_ids, countdown_enabled, cooled_required)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (holiday_name.strip(), holiday_date.isoformat(), hh, mm, int(holiday_stops[0]), holiday_note.strip(), 1 if holiday_active else 0, ",".join(map(str, holiday_screens)), 1 if holiday_countdown else 0, 1 if holiday_cooled else 0))
+            holiday_tour_id = cur.lastrowid
+            cur.executemany("INSERT INTO holiday_tour_stops (holiday_tour_id, location_id, position) VALUES (?, ?, ?)", [(holiday_tour_id, int(loc_id), pos) for pos, loc_id in enumerate(holiday_stops)])
+            conn.commit()
+        clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Gespeichert.")
         st.rerun()
 
@@ -2325,6 +2512,7 @@ def show_delivery_notes(conn, can_edit: bool):
     st.subheader("Frachtbrief / Lieferschein")
 
     tours = load_tours(conn)
+    tour_names = dict(zip(tours["id"].tolist(), tours["name"].tolist()))
     with st.expander("Neuen Frachtbrief aus Tour erzeugen", expanded=True):
         if tours.empty:
             st.info("Es sind noch keine Touren vorhanden.")
@@ -2334,7 +2522,7 @@ def show_delivery_notes(conn, can_edit: bool):
                 with c1:
                     delivery_date = st.date_input("Datum", value=now_berlin().date(), key="delivery_note_date")
                 with c2:
-                    selected_tour = st.selectbox("Tour", tours["id"].tolist(), format_func=lambda i: f"{int(i)} – {tours.loc[tours['id'] == i, 'name'].iloc[0]}")
+                    selected_tour = st.selectbox("Tour", tours["id"].tolist(), format_func=lambda i: f"{int(i)} – {tour_names[i]}")
                 with c3:
                     truck_name = st.text_input("Fahrzeug / Markierung")
                 with c4:
@@ -2343,7 +2531,8 @@ def show_delivery_notes(conn, can_edit: bool):
                 create_btn = st.form_submit_button("Frachtbrief aus Tour anlegen")
 
             if create_btn:
-                header_id = create_delivery_note_from_tour(conn, delivery_date, int(selected_tour), truck_name=truck_name, driver_name=driver_name, comment=comment)
+                with writer() as conn:
+                    header_id = create_delivery_note_from_tour(conn, delivery_date, int(selected_tour), truck_name=truck_name, driver_name=driver_name, comment=comment)
                 st.success(f"Frachtbrief angelegt / geladen: ID {header_id}")
                 st.session_state["selected_delivery_note_id"] = int(header_id)
                 st.rerun()
@@ -2355,6 +2544,7 @@ def show_delivery_notes(conn, can_edit: bool):
 
     default_header_id = st.session_state.get("selected_delivery_note_id")
     header_options = headers["id"].tolist()
+    header_labels = {i: f"ID {int(i)} – {d} – {t}" for i, d, t in zip(header_options, headers["delivery_date"].tolist(), headers["tour_name"].tolist())}
     if default_header_id not in header_options:
         default_header_id = header_options[0]
 
@@ -2362,12 +2552,12 @@ def show_delivery_notes(conn, can_edit: bool):
         "Frachtbrief auswählen",
         header_options,
         index=header_options.index(default_header_id),
-        format_func=lambda i: f"ID {int(i)} – {headers.loc[headers['id'] == i, 'delivery_date'].iloc[0]} – {headers.loc[headers['id'] == i, 'tour_name'].iloc[0]}",
+        format_func=lambda i: header_labels[i],
         key="selected_delivery_note_id_box"
     )
     st.session_state["selected_delivery_note_id"] = int(selected_header_id)
 
-    header_row = headers.loc[headers["id"] == selected_header_id].iloc[0]
+    header_row = headers.set_index("id", drop=False).loc[selected_header_id]
     items_df = load_delivery_note_items(conn, int(selected_header_id))
     if items_df.empty:
         st.warning("Dieser Frachtbrief hat keine Positionen.")
@@ -2423,7 +2613,8 @@ def show_delivery_notes(conn, can_edit: bool):
             save_item = st.form_submit_button("Position speichern")
 
         if save_item:
-            update_delivery_note_item(conn, int(row["id"]), int(gitterwagen), int(paletten), int(extra_long), int(rogiwa_unkomp), ladezeit, note)
+            with writer() as conn:
+                update_delivery_note_item(conn, int(row["id"]), int(gitterwagen), int(paletten), int(extra_long), int(rogiwa_unkomp), ladezeit, note)
             st.success(f"Position {int(row['position']) + 1} gespeichert.")
             st.rerun()
 
@@ -2434,7 +2625,8 @@ def show_delivery_notes(conn, can_edit: bool):
 
     if can_edit:
         if st.button("Frachtbrief löschen", key=f"delete_delivery_note_{int(selected_header_id)}"):
-            delete_delivery_note(conn, int(selected_header_id))
+            with writer() as conn:
+                delete_delivery_note(conn, int(selected_header_id))
             st.success("Frachtbrief gelöscht.")
             st.session_state.pop("selected_delivery_note_id", None)
             st.rerun()
@@ -2451,10 +2643,7 @@ def show_admin_screens(conn, can_edit: bool):
     st.dataframe(screens, use_container_width=True, height=300)
 
     st.markdown("### Monitore öffnen")
-    button_items = []
-    for _, r in screens.iterrows():
-        sid = int(r["id"])
-        button_items.append((f"Screen {sid} – {r['name']}", f"?mode=display&screenId={sid}"))
+    button_items = [(f"Screen {sid} – {name}", f"?mode=display&screenId={sid}") for sid, name in zip(screens["id"].astype(int), screens["name"])]
     button_items.extend([("Split A + B", "?mode=display&screenId=101"), ("Split C + D", "?mode=display&screenId=102"), ("Split Wareneingang 1 + 2", "?mode=display&screenId=103")])
     cols = st.columns(3)
     for idx, (label, url) in enumerate(button_items):
@@ -2465,12 +2654,12 @@ def show_admin_screens(conn, can_edit: bool):
         return
 
     sid = st.selectbox("Screen wählen", screens["id"].tolist())
-    row = screens.loc[screens["id"] == sid].iloc[0]
+    row = screens.set_index("id", drop=False).loc[sid]
 
     with st.form("edit_screen_form"):
         name = st.text_input("Name", row["name"])
-        mode = st.selectbox("Modus", ["DETAIL", "OVERVIEW", "WAREHOUSE"], index=["DETAIL", "OVERVIEW", "WAREHOUSE"].index(row["mode"]))
-        filter_type = st.selectbox("Filter Typ", ["ALLE", "KRANKENHAUS", "ALTENHEIM", "MVZ"], index=["ALLE", "KRANKENHAUS", "ALTENHEIM", "MVZ"].index(row["filter_type"]))
+        mode = st.selectbox("Modus", SCREEN_MODES, index=SCREEN_MODES.index(row["mode"]))
+        filter_type = st.selectbox("Filter Typ", SCREEN_FILTER_TYPES, index=SCREEN_FILTER_TYPES.index(row["filter_type"]))
         filter_locations = st.text_input("Filter Locations", row["filter_locations"] or "")
         refresh = st.number_input("Refresh (Sek.)", min_value=5, max_value=300, value=int(row["refresh_interval_seconds"]))
         holiday = st.checkbox("Feiertagsmodus", value=bool(row["holiday_flag"]))
@@ -2480,9 +2669,11 @@ def show_admin_screens(conn, can_edit: bool):
         submitted = st.form_submit_button("Speichern")
 
     if submitted:
-        conn.execute("UPDATE screens SET name=?, mode=?, filter_type=?, filter_locations=?, refresh_interval_seconds=?, holiday_flag=?, special_flag=? WHERE id=?", (name, mode, filter_type, filter_locations, int(refresh), 1 if holiday else 0, 1 if special else 0, int(sid)))
-        conn.execute("INSERT OR REPLACE INTO tickers (screen_id, text, active) VALUES (?, ?, ?)", (int(sid), ticker_text.strip(), 1 if ticker_active else 0))
-        conn.commit(); save_backup_to_dir(conn); cleanup_old_backups()
+        with writer() as conn:
+            conn.execute("UPDATE screens SET name=?, mode=?, filter_type=?, filter_locations=?, refresh_interval_seconds=?, holiday_flag=?, special_flag=? WHERE id=?", (name, mode, filter_type, filter_locations, int(refresh), 1 if holiday else 0, 1 if special else 0, int(sid)))
+            conn.execute("INSERT OR REPLACE INTO tickers (screen_id, text, active) VALUES (?, ?, ?)", (int(sid), ticker_text.strip(), 1 if ticker_active else 0))
+            conn.commit()
+        clear_load_caches(); save_backup_to_dir(conn); cleanup_old_backups()
         st.success("Screen gespeichert.")
         st.rerun()
 
@@ -2523,19 +2714,18 @@ def show_admin_users(conn, can_edit: bool):
 
 def show_system_status(conn):
     st.subheader("Systemstatus")
+    tours_count, loc_count, holiday_count, delivery_count, dep_count = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM tours), (SELECT COUNT(*) FROM locations), (SELECT COUNT(*) FROM holiday_tours),
+               (SELECT COUNT(*) FROM delivery_note_headers), (SELECT COUNT(*) FROM departures)
+    """).fetchone()
     c1, c2, c3 = st.columns(3)
     with c1:
         st.metric("Datenbank OK", "Ja" if integrity_ok(conn) else "Nein")
         st.caption(str(DB_PATH))
     with c2:
-        tours_count = int(read_df(conn, "SELECT COUNT(*) AS c FROM tours").iloc[0]["c"])
-        loc_count = int(read_df(conn, "SELECT COUNT(*) AS c FROM locations").iloc[0]["c"])
-        holiday_count = int(read_df(conn, "SELECT COUNT(*) AS c FROM holiday_tours").iloc[0]["c"])
-        delivery_count = int(read_df(conn, "SELECT COUNT(*) AS c FROM delivery_note_headers").iloc[0]["c"])
         st.metric("Touren", tours_count)
         st.caption(f"Einrichtungen: {loc_count} • Feiertagsbelieferung: {holiday_count} • Frachtbriefe: {delivery_count}")
     with c3:
-        dep_count = int(read_df(conn, "SELECT COUNT(*) AS c FROM departures").iloc[0]["c"])
         st.metric("Abfahrten gesamt", dep_count)
 
     st.markdown("### Letzte Backups")
@@ -2560,10 +2750,7 @@ def show_system_status(conn):
 def show_admin_mode():
     require_login()
     conn = get_connection()
-    cleanup_materialized_departures(conn)
-    materialize_tours_to_departures(conn)
-    materialize_holiday_tours_to_departures(conn)
-    update_departure_statuses(conn)
+    run_departure_maintenance()
     maybe_run_nightly_backup(conn)
 
     role = st.session_state.get("role", "viewer")
@@ -2616,7 +2803,8 @@ def show_admin_mode():
             backup_file = st.file_uploader("Backup importieren", type=["json"])
             if backup_file is not None and can_edit:
                 data = json.loads(backup_file.getvalue().decode("utf-8"))
-                import_backup_json(conn, data)
+                with writer() as conn:
+                    import_backup_json(conn, data)
                 save_backup_to_dir(conn, prefix="backup_import")
                 cleanup_old_backups()
                 st.success("Backup importiert.")
@@ -2649,49 +2837,47 @@ def show_display_mode(screen_id: int):
         return
 
     try:
-        conn = get_connection()
-        cleanup_materialized_departures(conn)
-        materialize_tours_to_departures(conn)
-        materialize_holiday_tours_to_departures(conn)
-        update_departure_statuses(conn)
-        screens = load_screens(conn)
-
-        if int(screen_id) in COMBINED_SCREEN_MAP:
-            cfg = COMBINED_SCREEN_MAP[int(screen_id)]
-            st_autorefresh(interval=15000, key=f"display_refresh_combined_{screen_id}")
-            render_split_screen(conn, cfg["left"], cfg["right"], cfg["name"])
-            return
-
-        if int(screen_id) in [5, 6]:
-            st_autorefresh(interval=15000, key=f"display_refresh_zone_overview_{screen_id}")
-            render_zone_overview_screen(conn, int(screen_id))
-            return
-
-        if screens.empty or int(screen_id) not in screens["id"].tolist():
-            show_display_error(f"Screen {screen_id} ist nicht konfiguriert")
-            return
-
-        screen = screens.loc[screens["id"] == int(screen_id)].iloc[0]
-        st_autorefresh(interval=int(screen["refresh_interval_seconds"]) * 1000, key=f"display_refresh_{screen_id}")
-
-        if bool(screen["holiday_flag"]) or bool(screen["special_flag"]):
-            labels = []
-            if bool(screen["holiday_flag"]): labels.append("Feiertagsbelieferung")
-            if bool(screen["special_flag"]): labels.append("Sonderplan")
-            st.markdown(f"<div style='display:flex;justify-content:center;align-items:center;height:100vh;background:#000;color:#fff;font-size:72px;font-weight:900;text-transform:uppercase;text-align:center;'>{' - '.join(labels)}</div>", unsafe_allow_html=True)
-            return
-
-        _, data = get_screen_data(conn, int(screen_id))
-        render_display_header(f"{screen['name']} (Screen {screen_id})", data)
-
-        if data.empty:
-            st.info("Keine Abfahrten im nächsten Zeitfenster.")
-        else:
-            rows, rb, tc, ex = build_display_rows(data)
-            render_big_table_v2(["Zeit", "Einrichtung", "Hinweis / Countdown"], rows, rb, tc, ex, html_cols={2})
+        run_departure_maintenance()
+        with reader() as conn:
+            screens_by_id = load_screens_by_id(conn)
+
+            if int(screen_id) in COMBINED_SCREEN_MAP:
+                cfg = COMBINED_SCREEN_MAP[int(screen_id)]
+                st_autorefresh(interval=display_refresh_interval_ms(screen_id, 15), key=f"display_refresh_combined_{screen_id}")
+                track_display_signature(screen_id, render_split_screen(conn, cfg["left"], cfg["right"], cfg["name"], screens_by_id))
+                return
+
+            if int(screen_id) in [5, 6]:
+                st_autorefresh(interval=display_refresh_interval_ms(screen_id, 15), key=f"display_refresh_zone_overview_{screen_id}")
+                track_display_signature(screen_id, render_zone_overview_screen(conn, int(screen_id), screens_by_id))
+                return
+
+            screen = screens_by_id.get(int(screen_id))
+            if screen is None:
+                show_display_error(f"Screen {screen_id} ist nicht konfiguriert")
+                return
+
+            st_autorefresh(interval=display_refresh_interval_ms(screen_id, int(screen["refresh_interval_seconds"])), key=f"display_refresh_{screen_id}")
+
+            if bool(screen["holiday_flag"]) or bool(screen["special_flag"]):
+                labels = []
+                if bool(screen["holiday_flag"]): labels.append("Feiertagsbelieferung")
+                if bool(screen["special_flag"]): labels.append("Sonderplan")
+                st.markdown(f"<div style='display:flex;justify-content:center;align-items:center;height:100vh;background:#000;color:#fff;font-size:72px;font-weight:900;text-transform:uppercase;text-align:center;'>{' - '.join(labels)}</div>", unsafe_allow_html=True)
+                return
+
+            _, data = get_screen_data(conn, int(screen_id), screens_by_id)
+            track_display_signature(screen_id, data)
+            render_display_header(f"{screen['name']} (Screen {screen_id})", data)
+
+            if data.empty:
+                st.info("Keine Abfahrten im nächsten Zeitfenster.")
+            else:
+                rows, rb, tc, ex = build_display_rows(data)
+                render_big_table_v2(["Zeit", "Einrichtung", "Hinweis / Countdown"], rows, rb, tc, ex, html_cols={2})
 
-        if bool(screen.get("ticker_active", 0)) and str(screen.get("text", "") or "").strip():
-            st.markdown(f"<div class='ticker'><div class='ticker__inner'>{escape_html(screen['text'])}</div></div>", unsafe_allow_html=True)
+            if bool(screen.get("ticker_active", 0)) and str(screen.get("text", "") or "").strip():
+                st.markdown(f"<div class='ticker'><div class='ticker__inner'>{escape_html(screen['text'])}</div></div>", unsafe_allow_html=True)
 
     except Exception as e:
         log_event(None, "error", "display_mode", details={"message": str(e), "screen_id": screen_id}, level="ERROR")